@@ -1,17 +1,23 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse
 from pydantic import BaseModel
 # akshare已移除，专注使用Tushare Pro数据源
 import tushare as ts
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import uvicorn
 from typing import Optional
 import logging
 import os
+import time
+import asyncio
+from functools import lru_cache
 
-from services import ValueLineService
+from services import ValueLineService, EXCHANGE_SUFFIX, create_pro_api, run_blocking
+from cache import cached, tushare_key, daily_ttl, FINANCIAL_TTL, META_TTL
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -21,31 +27,32 @@ logger = logging.getLogger(__name__)
 # 注意：请设置环境变量 TUSHARE_TOKEN 或在此处直接设置token
 TUSHARE_TOKEN = os.getenv('TUSHARE_TOKEN', 'your_tushare_token_here')
 if TUSHARE_TOKEN and TUSHARE_TOKEN != 'your_tushare_token_here':
-    ts.set_token(TUSHARE_TOKEN)
-    pro = ts.pro_api()
-    vl_service = ValueLineService(TUSHARE_TOKEN)
+    # 全局共享一个带连接池的Tushare客户端
+    pro = create_pro_api(TUSHARE_TOKEN)
+    vl_service = ValueLineService(TUSHARE_TOKEN, pro=pro)
     logger.info("✅ Tushare Pro API 初始化成功")
 else:
     pro = None
     vl_service = None
     logger.error("❌ Tushare Pro token未配置，请设置TUSHARE_TOKEN环境变量")
 
-app = FastAPI(title="A股股票分析API", description="基于Tushare Pro的股票数据分析服务")
+# orjson直接序列化NumPy数组，避免大列表转换为Python对象
+app = FastAPI(title="A股股票分析API", description="基于Tushare Pro的股票数据分析服务",
+              default_response_class=ORJSONResponse)
+# 图表数据JSON较大，超过1KB的响应启用gzip压缩（压缩级别5兼顾压缩率与CPU开销）
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 app.mount("/static", StaticFiles(directory="."), name="static")
 
+@lru_cache(maxsize=4096)
 def convert_to_ts_code(stock_code: str) -> str:
     """
     将6位股票代码转换为Tushare格式的TS代码
-    例如: 000001 -> 000001.SZ, 600000 -> 600000.SH
+    例如: 000001 -> 000001.SZ, 600000 -> 600000.SH, 830799 -> 830799.BJ
     """
-    if stock_code.startswith('6'):
-        return f"{stock_code}.SH"  # 上海交易所
-    elif stock_code.startswith(('0', '3')):
-        return f"{stock_code}.SZ"  # 深圳交易所
-    else:
-        return f"{stock_code}.SH"  # 默认上海交易所
+    # 按首位数字查表确定交易所，未知前缀默认上海交易所
+    return stock_code + EXCHANGE_SUFFIX.get(stock_code[:1], '.SH')
 
-def get_stock_data_tushare(ts_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+async def get_stock_data_tushare(ts_code: str, start_date: str, end_date: str) -> pd.DataFrame:
     """
     使用Tushare Pro获取股票历史数据和PE_TTM数据
     """
@@ -57,51 +64,75 @@ def get_stock_data_tushare(ts_code: str, start_date: str, end_date: str) -> pd.D
         start_date_ts = start_date.replace('-', '')
         end_date_ts = end_date.replace('-', '')
         
-        # 获取股票基本行情数据
-        stock_data = ts.pro_bar(ts_code=ts_code, start_date=start_date_ts, end_date=end_date_ts, adj='qfq')
+        # 并发获取：股票基本行情数据、每日基本面指标（包含PE_TTM）、财务指标数据（包含ROE）
+        # 由于财务数据是季度数据，我们需要获取最近的财务数据
+        # 只取下游用到的列；结束日期为今天的区间只缓存到当日数据发布（daily_ttl），历史区间的财务数据缓存7天
+        bar_fields = 'ts_code,trade_date,close'
+        basic_fields = 'ts_code,trade_date,pe_ttm,pb'
+        fina_fields = 'ts_code,end_date,roe'
+        stock_data, basic_data, fina_data = await asyncio.gather(
+            run_blocking(cached, tushare_key('pro_bar', ts_code, start_date_ts, end_date_ts, 'qfq', bar_fields), daily_ttl(end_date_ts),
+                         lambda: ts.pro_bar(ts_code=ts_code, api=pro, start_date=start_date_ts, end_date=end_date_ts,
+                                            adj='qfq', fields=bar_fields)),
+            run_blocking(cached, tushare_key('daily_basic', ts_code, start_date_ts, end_date_ts, basic_fields), daily_ttl(end_date_ts),
+                         lambda: pro.daily_basic(ts_code=ts_code, start_date=start_date_ts, end_date=end_date_ts,
+                                                 fields=basic_fields)),
+            run_blocking(cached, tushare_key('fina_indicator', ts_code, start_date_ts, end_date_ts, fina_fields), daily_ttl(end_date_ts, FINANCIAL_TTL),
+                         lambda: pro.fina_indicator(ts_code=ts_code, start_date=start_date_ts, end_date=end_date_ts,
+                                                    fields=fina_fields))
+        )
         
-        if stock_data.empty:
+        if stock_data is None or stock_data.empty:
             raise Exception(f"未找到股票 {ts_code} 的历史数据")
         
-        # 获取每日基本面指标（包含PE_TTM）
-        basic_data = pro.daily_basic(ts_code=ts_code, start_date=start_date_ts, end_date=end_date_ts, 
-                                   fields='ts_code,trade_date,pe_ttm,pb,ps_ttm')
-        
-        # 获取财务指标数据（包含ROE）
-        # 由于财务数据是季度数据，我们需要获取最近的财务数据
-        fina_data = pro.fina_indicator(ts_code=ts_code, start_date=start_date_ts, end_date=end_date_ts,
-                                     fields='ts_code,end_date,roe')
-        
         # 合并数据
         if not basic_data.empty:
-            merged_data = pd.merge(stock_data, basic_data, on=['ts_code', 'trade_date'], how='left')
+            merged_data = pd.merge(stock_data, basic_data, on=['ts_code', 'trade_date'], how='left', validate='one_to_one')
         else:
             merged_data = stock_data
-            merged_data['pe_ttm'] = None
         
-        # 处理ROE数据（季度数据需要前向填充）
-        if not fina_data.empty:
-            # 将财务数据的end_date转换为trade_date格式
-            fina_data['trade_date'] = fina_data['end_date']
-            fina_data = fina_data.drop('end_date', axis=1)
-            
-            # 合并ROE数据
-            merged_data = pd.merge(merged_data, fina_data, on=['ts_code', 'trade_date'], how='left')
-            
-            # 前向填充ROE数据（因为ROE是季度数据）
-            merged_data['roe'] = merged_data['roe'].fillna(method='ffill')
-        else:
-            merged_data['roe'] = None
+        # 只保留下游用到的列（缺失的pe_ttm/pb补NaN），指标列转为float32减少排序时的内存带宽
+        merged_data = merged_data.reindex(columns=['ts_code', 'trade_date', 'close', 'pe_ttm', 'pb'])
+        merged_data = merged_data.astype({'pe_ttm': 'float32', 'pb': 'float32'})
         
-        # 按日期排序
+        # 按日期排序（ROE需按时间顺序前向填充）
         merged_data = merged_data.sort_values('trade_date')
         
+        # 处理ROE数据（季度数据）：每个交易日取报告期end_date不晚于该日的最近一期ROE（as-of对齐），
+        # 用searchsorted在排好序的报告期上二分查找，报告期不是交易日时也能对齐；无财务数据时全部为NaN
+        roe = np.full(len(merged_data), np.nan, dtype='float32')
+        if not fina_data.empty:
+            fina_data = fina_data.dropna(subset=['roe']).drop_duplicates(subset=['end_date']).sort_values('end_date')
+        # ROE全部缺失时dropna后为空，保持全NaN（下游使用默认值）
+        if not fina_data.empty:
+            end_dates = fina_data['end_date'].astype('int64').to_numpy()
+            trade_dates = merged_data['trade_date'].astype('int64').to_numpy()
+            idx = np.searchsorted(end_dates, trade_dates, side='right') - 1
+            roe = np.where(idx >= 0, fina_data['roe'].to_numpy(dtype='float32')[idx.clip(0)], np.nan)
+        merged_data['roe'] = roe.astype('float32')
+        
         return merged_data
         
     except Exception as e:
         logger.error(f"Tushare Pro获取数据失败: {e}")
         raise e
 
+async def get_stock_name(ts_code: str, stock_code: str) -> str:
+    """
+    获取股票名称（在线程池中请求Tushare），失败时返回占位名称
+    """
+    stock_name = f"股票{stock_code}"
+    try:
+        # 使用Tushare Pro获取股票基本信息
+        stock_basic = await run_blocking(cached, tushare_key('stock_basic', ts_code, 'ts_code,name'), META_TTL,
+                                         lambda: pro.stock_basic(ts_code=ts_code, fields='ts_code,name'))
+        if stock_basic is not None and not stock_basic.empty:
+            stock_name = stock_basic['name'].iloc[0]
+            logger.info(f"✅ 获取股票名称: {stock_name}")
+    except Exception as e:
+        logger.warning(f"获取股票基本信息失败: {e}")
+    return stock_name
+
 @app.get("/api/value_line_report/{stock_code}")
 async def get_value_line_report(stock_code: str):
     """
@@ -112,8 +143,10 @@ async def get_value_line_report(stock_code: str):
     
     try:
         logger.info(f"生成研报: {stock_code}")
-        data = vl_service.get_report_data(stock_code)
-        return data
+        # 研报按(股票, 日期)缓存，同一天重复访问不再请求Tushare
+        data = await vl_service.get_report_data_cached(stock_code)
+        # 图表数据为NumPy数组，直接交给orjson序列化（跳过jsonable_encoder）
+        return ORJSONResponse(data)
     except Exception as e:
         logger.error(f"研报生成失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -168,24 +201,16 @@ async def get_stock_data(request: StockRequest):
         ts_code = convert_to_ts_code(stock_code)
         logger.info(f"转换后的TS代码: {ts_code}")
         
-        # 获取股票名称
-        stock_name = f"股票{stock_code}"
-        try:
-            if pro:
-                # 使用Tushare Pro获取股票基本信息
-                stock_basic = pro.stock_basic(ts_code=ts_code, fields='ts_code,name')
-                if not stock_basic.empty:
-                    stock_name = stock_basic['name'].iloc[0]
-                    logger.info(f"✅ 获取股票名称: {stock_name}")
-        except Exception as e:
-            logger.warning(f"获取股票基本信息失败: {e}")
-        
         # 获取股票历史数据和市盈率数据
         if not pro:
             raise HTTPException(status_code=500, detail="Tushare Pro未配置，无法获取数据")
         
         try:
-            stock_data = get_stock_data_tushare(ts_code, start_date, end_date)
+            # 股票名称与历史数据并发获取
+            stock_name, stock_data = await asyncio.gather(
+                get_stock_name(ts_code, stock_code),
+                get_stock_data_tushare(ts_code, start_date, end_date)
+            )
             if stock_data.empty:
                 raise HTTPException(status_code=404, detail="未找到该股票的历史数据")
             logger.info(f"✅ 使用Tushare Pro获取到{len(stock_data)}条数据")
@@ -196,55 +221,44 @@ async def get_stock_data(request: StockRequest):
         # 数据处理和准备返回
         
         # Tushare Pro数据格式：trade_date, close, pe_ttm
-        stock_data['trade_date'] = pd.to_datetime(stock_data['trade_date'])
+        stock_data['trade_date'] = pd.to_datetime(stock_data['trade_date'], format='%Y%m%d')
         stock_data = stock_data.sort_values('trade_date')
         
         dates = stock_data['trade_date'].dt.strftime('%Y-%m-%d').tolist()
-        prices = stock_data['close'].tolist()
-        
-        # 处理市盈率数据
-        pe_ratios = []
-        for _, row in stock_data.iterrows():
-            pe_value = row.get('pe_ttm', 20.0)
-            if pd.isna(pe_value) or pe_value <= 0 or pe_value > 1000:
-                pe_value = 20.0  # 默认值
-            pe_ratios.append(float(pe_value))
-        
-        # 处理ROE数据
-        roe_ratios = []
-        for _, row in stock_data.iterrows():
-            roe_value = row.get('roe', 10.0)
-            if pd.isna(roe_value) or roe_value < -100 or roe_value > 100:
-                roe_value = 10.0  # 默认值10%
-            roe_ratios.append(float(roe_value))
-
-        # 处理PB数据
-        pb_ratios = []
-        for _, row in stock_data.iterrows():
-            pb_value = row.get('pb', 1.0)
-            if pd.isna(pb_value):
-                pb_value = 1.0  # 默认值
-            pb_ratios.append(float(pb_value))
+        prices = np.ascontiguousarray(stock_data['close'].to_numpy(dtype='float64'))
+        
+        # 处理市盈率/ROE/PB数据（按列向量化处理，缺失列按NaN处理）
+        ratios = stock_data.reindex(columns=['pe_ttm', 'roe', 'pb'])
+        
+        pe = ratios['pe_ttm'].to_numpy(dtype='float32')
+        pe = np.where(np.isnan(pe) | (pe <= 0) | (pe > 1000), 20.0, pe)  # 默认值
+        
+        roe = ratios['roe'].to_numpy(dtype='float32')
+        roe = np.where(np.isnan(roe) | (roe < -100) | (roe > 100), 10.0, roe)  # 默认值10%
+        
+        pb = ratios['pb'].to_numpy(dtype='float32')
+        pb = np.where(np.isnan(pb), 1.0, pb)  # 默认值
         
         logger.info(f"✅ 使用Tushare Pro数据，共{len(stock_data)}条记录")
-        logger.info(f"✅ 市盈率范围: {min(pe_ratios):.2f} - {max(pe_ratios):.2f}")
-        logger.info(f"✅ ROE范围: {min(roe_ratios):.2f}% - {max(roe_ratios):.2f}%")
-        logger.info(f"✅ PB范围: {min(pb_ratios):.2f} - {max(pb_ratios):.2f}")
+        logger.info(f"✅ 市盈率范围: {float(pe.min()):.2f} - {float(pe.max()):.2f}")
+        logger.info(f"✅ ROE范围: {float(roe.min()):.2f}% - {float(roe.max()):.2f}%")
+        logger.info(f"✅ PB范围: {float(pb.min()):.2f} - {float(pb.max()):.2f}")
         
         # 数据验证
         if len(dates) == 0:
             raise HTTPException(status_code=404, detail="指定时间范围内没有交易数据")
         
-        # 返回数据
-        return StockResponse(
-            stock_name=stock_name,
-            stock_code=stock_code,
-            dates=dates,
-            prices=prices,
-            pe_ratios=pe_ratios,
-            roe_ratios=roe_ratios,
-            pb_ratios=pb_ratios
-        )
+        # 返回数据（结构同StockResponse，数值列为NumPy数组，由orjson直接序列化）
+        return ORJSONResponse({
+            "stock_name": stock_name,
+            "stock_code": stock_code,
+            "dates": dates,
+            "prices": prices,
+            "pe_ratios": pe,
+            "roe_ratios": roe,
+            "pb_ratios": pb,
+            "error": None
+        })
         
     except HTTPException:
         raise
@@ -252,6 +266,52 @@ async def get_stock_data(request: StockRequest):
         logger.error(f"获取股票数据时发生未知错误: {e}")
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
 
+# A股股票列表缓存（每小时刷新），搜索时直接在预处理好的数组上匹配
+STOCK_LIST_TTL = 3600
+_STOCK_LIST_CACHE = {"ts": 0, "symbols": None, "names": None, "names_lower": None}
+# 过期后只允许一个请求刷新（stock_basic全量接口限频严格），其余请求继续使用旧列表
+_STOCK_LIST_LOCK = asyncio.Lock()
+
+def _stock_list_fresh() -> bool:
+    return _STOCK_LIST_CACHE["symbols"] is not None and time.time() - _STOCK_LIST_CACHE["ts"] < STOCK_LIST_TTL
+
+async def get_stock_list_index() -> dict:
+    """
+    获取缓存的A股股票列表及搜索用数组，过期后重新从Tushare拉取（在线程池中执行，不阻塞事件循环）
+    刷新失败（异常或返回空表）时继续使用旧缓存
+    """
+    if _stock_list_fresh():
+        return _STOCK_LIST_CACHE
+    # 已有旧列表且其他请求正在刷新，直接使用旧列表
+    if _STOCK_LIST_CACHE["symbols"] is not None and _STOCK_LIST_LOCK.locked():
+        return _STOCK_LIST_CACHE
+    
+    async with _STOCK_LIST_LOCK:
+        # 等锁期间可能已被其他请求刷新
+        if _stock_list_fresh():
+            return _STOCK_LIST_CACHE
+        
+        try:
+            df = await run_blocking(lambda: pro.stock_basic(exchange='', list_status='L', fields='ts_code,symbol,name'))
+            # Tushare在HTTP错误时返回空DataFrame而不抛异常，同样视为刷新失败
+            if df is None or df.empty:
+                raise Exception("Tushare返回空的股票列表")
+        except Exception as e:
+            if _STOCK_LIST_CACHE["symbols"] is None:
+                raise
+            logger.warning(f"刷新股票列表失败，继续使用旧缓存: {e}")
+            return _STOCK_LIST_CACHE
+        
+        names = df['name'].fillna('').to_numpy(dtype=str)
+        _STOCK_LIST_CACHE.update(
+            ts=time.time(),
+            symbols=df['symbol'].fillna('').to_numpy(dtype=str),
+            names=names,
+            names_lower=np.char.lower(names)
+        )
+        logger.info(f"✅ 股票列表已刷新，共{len(df)}只股票")
+        return _STOCK_LIST_CACHE
+
 @app.get("/api/stock_search/{keyword}")
 async def search_stocks(keyword: str):
     """
@@ -261,24 +321,24 @@ async def search_stocks(keyword: str):
         if not pro:
             raise HTTPException(status_code=500, detail="Tushare Pro未配置")
         
-        # 获取A股股票列表
-        stock_list = pro.stock_basic(exchange='', list_status='L', fields='ts_code,symbol,name')
+        # 获取A股股票列表（缓存）
+        stock_index = await get_stock_list_index()
         
         # 搜索匹配的股票
         if keyword.isdigit():
             # 如果是数字，按代码搜索
-            results = stock_list[stock_list['symbol'].str.contains(keyword, na=False)]
+            mask = np.char.find(stock_index['symbols'], keyword) >= 0
         else:
-            # 如果是文字，按名称搜索
-            results = stock_list[stock_list['name'].str.contains(keyword, na=False)]
+            # 如果是文字，按名称搜索（忽略大小写）
+            mask = np.char.find(stock_index['names_lower'], keyword.lower()) >= 0
         
         # 限制返回结果数量
-        results = results.head(10)
+        idx = np.flatnonzero(mask)[:10]
         
         return {
             "results": [
-                {"code": row['symbol'], "name": row['name']} 
-                for _, row in results.iterrows()
+                {"code": code, "name": name}
+                for code, name in zip(stock_index['symbols'][idx].tolist(), stock_index['names'][idx].tolist())
             ]
         }
         
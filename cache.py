@@ -0,0 +1,137 @@
+import io
+import os
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone, time as dtime
+from typing import Callable, Optional
+
+import pandas as pd
+
+try:
+    import redis
+    import pyarrow  # noqa: F401  parquet engine for frames stored in Redis
+except ImportError:  # redis + pyarrow are optional, fall back to the in-process cache
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# TTLs (seconds)
+DAILY_TTL = 24 * 3600           # daily price / valuation series
+FINANCIAL_TTL = 7 * 24 * 3600   # annual / quarterly statements
+META_TTL = 7 * 24 * 3600        # stock_basic meta info
+
+# Tushare publishes the day's daily / daily_basic some time after the 15:00 close (Beijing time, no DST).
+# Series reaching today are only cached until this cutoff so the close is picked up the same day.
+MARKET_TZ = timezone(timedelta(hours=8))
+DATA_PUBLISHED = dtime(17, 0)
+
+# Redis is used when REDIS_URL is set (e.g. redis://localhost:6379/0),
+# otherwise responses are cached in-process.
+REDIS_URL = os.getenv('REDIS_URL')
+MEMORY_MAX_ENTRIES = 512
+
+
+class TushareCache:
+    """
+    Cache for Tushare DataFrame responses.
+    Every hit returns a fresh copy that callers may mutate. Redis entries are stored as
+    parquet so a writable Redis cannot inject code; pickle is only used in-process.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self.client = None
+        self._memory = OrderedDict()  # key -> (expires_at, blob)
+        self._lock = threading.Lock()  # fetches run concurrently in worker threads
+        if redis_url and redis is not None:
+            self.client = redis.Redis.from_url(redis_url)
+            logger.info(f"Tushare cache backed by Redis: {redis_url}")
+        elif redis_url:
+            logger.warning("REDIS_URL is set but redis / pyarrow are not installed, using in-process cache")
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        if self.client is not None:
+            try:
+                blob = self.client.get(key)
+            except redis.RedisError as e:
+                logger.warning(f"Redis get failed for {key}: {e}")
+                return None
+            if blob is None:
+                return None
+            try:
+                return pd.read_parquet(io.BytesIO(blob))
+            except Exception as e:
+                logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+                return None
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, blob = entry
+            if expires_at < time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+        return pickle.loads(blob)
+
+    def set(self, key: str, ttl: int, df: pd.DataFrame):
+        if self.client is not None:
+            buf = io.BytesIO()
+            try:
+                df.to_parquet(buf)
+                self.client.setex(key, ttl, buf.getvalue())
+            except redis.RedisError as e:
+                logger.warning(f"Redis set failed for {key}: {e}")
+            except Exception as e:
+                logger.warning(f"Could not serialize {key} for Redis: {e}")
+            return
+
+        blob = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._memory[key] = (time.time() + ttl, blob)
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_MAX_ENTRIES:
+                self._memory.popitem(last=False)
+
+
+_cache = TushareCache(REDIS_URL)
+
+
+def tushare_key(api: str, ts_code: str, *parts) -> str:
+    """Build a cache key like 'tushare:daily_basic:000001.SZ:20200101:20201231'"""
+    return ':'.join(['tushare', api, ts_code] + [str(p) for p in parts if p])
+
+
+def next_data_refresh(now: datetime) -> datetime:
+    """First publication cutoff strictly after now (now must be timezone-aware)"""
+    cutoff = datetime.combine(now.astimezone(MARKET_TZ).date(), DATA_PUBLISHED, tzinfo=MARKET_TZ)
+    return cutoff if now < cutoff else cutoff + timedelta(days=1)
+
+
+def daily_ttl(end_date: str, ttl: int = DAILY_TTL) -> int:
+    """
+    Effective TTL for a series requested up to end_date (YYYYMMDD).
+    Ranges reaching today may still gain rows, so they expire at the next publication cutoff.
+    """
+    now = datetime.now(MARKET_TZ)
+    if end_date < now.strftime('%Y%m%d'):
+        return ttl
+    return max(1, min(ttl, int((next_data_refresh(now) - now).total_seconds())))
+
+
+def cached(key: str, ttl: int, fetch: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Return the cached DataFrame for key, or call fetch() and cache its result.
+    Empty / None results are not cached so transient API failures are retried.
+    """
+    hit = _cache.get(key)
+    if hit is not None:
+        return hit
+
+    df = fetch()
+    if df is not None and not df.empty:
+        _cache.set(key, ttl, df)
+    return df
@@ -1,37 +1,124 @@
+import asyncio
 import tushare as ts
+from tushare.pro import client as ts_client
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from functools import lru_cache
+from collections import OrderedDict
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+
+from cache import (cached, tushare_key, daily_ttl, next_data_refresh, DAILY_TTL, FINANCIAL_TTL, META_TTL,
+                   MARKET_TZ)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+REPORT_CACHE_SIZE = 256
+
+# Exchange suffix by the first digit of an A-share code: 6 -> Shanghai, 0/3 -> Shenzhen, 4/8 -> Beijing
+EXCHANGE_SUFFIX = {'6': '.SH', '0': '.SZ', '3': '.SZ', '8': '.BJ', '4': '.BJ'}
+
+def create_pro_api(token: str):
+    """
+    Create the Tushare Pro client shared by the whole process.
+    Tushare's DataApi posts every query via module-level requests.post, so it is routed
+    through one pooled Session to reuse connections across (concurrent) requests.
+    This relies on tushare internals, hence the pinned version in requirements.txt.
+    Create it once at startup and pass it around; do not call ts.pro_api() per request.
+    """
+    if getattr(ts_client, 'requests', None) is requests:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20,
+                              max_retries=Retry(total=3, backoff_factor=0.3))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        ts_client.requests = session
+    elif not hasattr(ts_client, 'requests'):
+        logger.warning("tushare.pro.client no longer uses requests, Tushare calls will not use the pooled session")
+
+    ts.set_token(token)
+    return ts.pro_api(token)
+
+async def run_blocking(func, *args):
+    """Run a blocking call (e.g. a Tushare request) in the default thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+def _cagr_batch(values: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """
+    CAGR (%) for every column of values (rows = ascending years) over every span in years.
+    Returns shape (len(years), n_cols), NaN where history is too short or an endpoint is not positive.
+    """
+    n = values.shape[0]
+    start = values[np.clip(n - 1 - years, 0, None)]
+    end = values[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = (end / start) ** (1.0 / years[:, None]) - 1
+    valid = (years < n)[:, None] & (start > 0) & (end > 0)
+    return np.where(valid, np.round(cagr * 100, 2), np.nan)
+
 class ValueLineService:
-    def __init__(self, token: str):
+    def __init__(self, token: str, pro=None):
         self.token = token
-        ts.set_token(token)
-        self.pro = ts.pro_api()
+        self.pro = pro if pro is not None else create_pro_api(token)
+        self._report_cache = OrderedDict()  # ts_code -> (expires_at, report)
 
-    def get_report_data(self, stock_code: str) -> Dict[str, Any]:
+    async def get_report_data_cached(self, stock_code: str) -> Dict[str, Any]:
+        """
+        get_report_data memoized per ts_code until the day's data is published (LRU, in-process).
+        Reports with a missing section are not stored, so transient Tushare failures are retried.
+        """
+        ts_code = self._ensure_ts_code(stock_code)
+        now = datetime.now(MARKET_TZ)
+        entry = self._report_cache.get(ts_code)
+        if entry is not None and entry[0] > now:
+            self._report_cache.move_to_end(ts_code)
+            return entry[1]
+
+        data, complete = await self._build_report(ts_code)
+        if complete:
+            self._report_cache[ts_code] = (next_data_refresh(now), data)
+            self._report_cache.move_to_end(ts_code)
+            while len(self._report_cache) > REPORT_CACHE_SIZE:
+                self._report_cache.popitem(last=False)
+        else:
+            self._report_cache.pop(ts_code, None)
+        return data
+
+    async def get_report_data(self, stock_code: str) -> Dict[str, Any]:
         """
         Orchestrator to get all data for the Value Line style report.
         stock_code: Input code (e.g., '000001' or '000001.SZ')
         """
-        ts_code = self._ensure_ts_code(stock_code)
-        
-        # 1. Basic Info & Meta
-        meta = self._get_meta_info(ts_code)
+        data, _ = await self._build_report(self._ensure_ts_code(stock_code))
+        return data
+
+    async def _build_report(self, ts_code: str) -> Tuple[Dict[str, Any], bool]:
+        """Build the report; the flag is False when any section came back empty (possibly a failed fetch)"""
+        # Beijing date, so the daily series cache cap (daily_ttl) sees the range as reaching today
+        now = datetime.now(MARKET_TZ)
+        end_date = now.strftime('%Y%m%d')
+        start_date = (now - timedelta(days=365*15)).strftime('%Y%m%d')
         
-        # 2. Historical Market Data (Price, PE, PB, etc.) - Last 15 years approx
-        end_date = datetime.now().strftime('%Y%m%d')
-        start_date = (datetime.now() - timedelta(days=365*15)).strftime('%Y%m%d')
-        daily_df = self._get_daily_market_data(ts_code, start_date, end_date)
+        # 1-3, 7-8. Fetch independent data sets concurrently:
+        # Basic Info & Meta, Historical Market Data (Price, PE, PB, etc.) - Last 15 years approx,
+        # Financial Statistical Array (Annual Data), Quarterly Data, Capital Structure (Latest)
+        meta, daily_df, financials, quarterly, capital_struct = await asyncio.gather(
+            run_blocking(self._get_meta_info, ts_code),
+            self._get_daily_market_data(ts_code, start_date, end_date),
+            self._get_annual_financials(ts_code, start_date),
+            run_blocking(self._get_quarterly_data, ts_code),
+            run_blocking(self._get_capital_structure, ts_code)
+        )
         
-        # 3. Financial Statistical Array (Annual Data)
-        financials = self._get_annual_financials(ts_code, start_date, end_date)
+        # 4a. Daily aggregates (latest row, PE distribution) shared by the sections below
+        daily_stats = self._summarize_daily(daily_df)
         
         # 4. Calculate Derived Metrics (CAGR, Per Share, etc.)
         stats_array = self._calculate_statistical_array(financials, daily_df)
@@ -43,13 +130,7 @@ class ValueLineService:
         ranks = self._generate_ranks(ts_code, daily_df, stats_array)
 
         # 6. Top Metrics Strip
-        top_metrics = self._calculate_top_metrics(daily_df, stats_array)
-        
-        # 7. Quarterly Data (Recent 8-12 quarters)
-        quarterly = self._get_quarterly_data(ts_code)
-
-        # 8. Capital Structure (Latest)
-        capital_struct = self._get_capital_structure(ts_code)
+        top_metrics = self._calculate_top_metrics(daily_stats, stats_array)
         
         # 9. Commentary (Placeholder)
         commentary = self._generate_commentary(meta, top_metrics, ranks)
@@ -59,11 +140,11 @@ class ValueLineService:
             "ranks": ranks,
             "top_metrics": top_metrics,
             "chart": {
-                "dates": daily_df['trade_date'].tolist(),
-                "price": daily_df['close'].tolist(),
-                "pe": daily_df['pe_ttm'].tolist(),
-                "pb": daily_df['pb'].tolist(),
-                "roe": daily_df.get('roe_ttm', []).tolist() if 'roe_ttm' in daily_df else []
+                "dates": daily_df['trade_date'].dt.strftime('%Y-%m-%d').tolist(),
+                "price": self._to_array(daily_df['close']),
+                "pe": self._to_array(daily_df['pe_ttm']),
+                "pb": self._to_array(daily_df['pb']),
+                "roe": self._to_array(daily_df['roe_ttm']) if 'roe_ttm' in daily_df else []
             },
             "statistical_array": stats_array,
             "growth_rates": growth_rates,
@@ -72,10 +153,12 @@ class ValueLineService:
             "commentary": commentary
         }
         
-        return self._clean_data(raw_data)
+        complete = (not daily_df.empty and financials.attrs.get('complete', False)
+                    and bool(stats_array) and bool(quarterly) and bool(capital_struct))
+        return self._clean_data(raw_data), complete
 
     def _clean_data(self, data):
-        """Recursively replace NaN/Inf with None for JSON compliance"""
+        """Recursively replace NaN/Inf with None for JSON compliance (NumPy arrays are left to orjson)"""
         if isinstance(data, dict):
             return {k: self._clean_data(v) for k, v in data.items()}
         elif isinstance(data, list):
@@ -87,19 +170,23 @@ class ValueLineService:
         else:
             return data
 
-    def _ensure_ts_code(self, code: str) -> str:
-        if code.endswith('.SZ') or code.endswith('.SH') or code.endswith('.BJ'):
+    @staticmethod
+    def _to_array(series: pd.Series) -> np.ndarray:
+        """Chart column as a contiguous NumPy array, serialized directly by orjson (NaN -> null)"""
+        return np.ascontiguousarray(series.to_numpy())
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _ensure_ts_code(code: str) -> str:
+        if code.endswith(('.SZ', '.SH', '.BJ')):
             return code
-        if code.startswith('6'):
-            return f"{code}.SH"
-        elif code.startswith('8') or code.startswith('4'):
-            return f"{code}.BJ"
-        else:
-            return f"{code}.SZ"
+        return code + EXCHANGE_SUFFIX.get(code[:1], '.SZ')
 
     def _get_meta_info(self, ts_code: str) -> Dict:
         """Fetch basic stock info"""
-        df = self.pro.stock_basic(ts_code=ts_code, fields='ts_code,symbol,name,fullname,industry,market,list_date')
+        fields = 'ts_code,symbol,name,fullname,industry,market,list_date'
+        df = cached(tushare_key('stock_basic', ts_code, fields), META_TTL,
+                    lambda: self.pro.stock_basic(ts_code=ts_code, fields=fields))
         if df.empty:
             raise ValueError(f"Stock {ts_code} not found.")
         
@@ -114,28 +201,40 @@ class ValueLineService:
             "report_date": datetime.now().strftime('%Y-%m-%d')
         }
 
-    def _get_daily_market_data(self, ts_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+    async def _get_daily_market_data(self, ts_code: str, start_date: str, end_date: str) -> pd.DataFrame:
         """Get daily price + valuation metrics (PE, PB)"""
-        # Get Price
-        df_price = ts.pro_bar(ts_code=ts_code, start_date=start_date, end_date=end_date, adj='qfq')
+        # Only columns the report consumes: close for the chart, PE/PB, dividend yield and market cap
+        fields_price = 'ts_code,trade_date,close'
+        fields_basic = 'ts_code,trade_date,pe_ttm,pb,dv_ratio,total_mv'
+        # Get Price and Valuation (PE, PB, dividend yield) concurrently
+        df_price, df_basic = await asyncio.gather(
+            run_blocking(cached, tushare_key('pro_bar', ts_code, start_date, end_date, 'qfq', fields_price), daily_ttl(end_date),
+                         lambda: ts.pro_bar(ts_code=ts_code, api=self.pro, start_date=start_date, end_date=end_date,
+                                            adj='qfq', fields=fields_price)),
+            run_blocking(cached, tushare_key('daily_basic', ts_code, start_date, end_date, fields_basic), daily_ttl(end_date),
+                         lambda: self.pro.daily_basic(ts_code=ts_code, start_date=start_date, end_date=end_date,
+                                                      fields=fields_basic))
+        )
         if df_price is None or df_price.empty:
             return pd.DataFrame()
-            
-        # Get Valuation (PE, PB, turnover)
-        df_basic = self.pro.daily_basic(ts_code=ts_code, start_date=start_date, end_date=end_date, 
-                                        fields='ts_code,trade_date,pe_ttm,pb,dv_ratio,turnover_rate,total_mv')
         
         # Merge
         df_price['trade_date'] = df_price['trade_date'].astype(str)
         if not df_basic.empty:
-            df = pd.merge(df_price, df_basic, on=['ts_code', 'trade_date'], how='left')
+            df = pd.merge(df_price, df_basic, on=['ts_code', 'trade_date'], how='left', validate='one_to_one')
         else:
             df = df_price
             
+        # Compact the 15y frame once at the source: datetime trade_date, float32 metrics.
+        # total_mv stays float64, float32 cannot hold its 万元 precision.
+        df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
+        float32_cols = ['close', 'pe_ttm', 'pb', 'dv_ratio']
+        df = df.astype({c: 'float32' for c in float32_cols if c in df})
+            
         df = df.sort_values('trade_date').reset_index(drop=True)
         return df
 
-    def _get_annual_financials(self, ts_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+    async def _get_annual_financials(self, ts_code: str, start_date: str) -> pd.DataFrame:
         """
         Fetch Income, Balance Sheet, Cash Flow, Fina Indicator for Annual Reports (end_type='4')
         """
@@ -144,32 +243,42 @@ class ValueLineService:
         fields_cash = 'ts_code,end_date,n_cashflow_act,c_paid_for_fix_assets' 
         fields_fina = 'ts_code,end_date,roe,grossprofit_margin,netprofit_margin' 
         
-        def get_sheet(api_func, fields):
+        # Statements only change when a new report is published: query from the start of the window's
+        # year with no end date so the cache key is stable all year, then trim to the window locally
+        since = start_date[:4] + '0101'
+
+        def get_sheet(api_name, fields):
             try:
-                df = api_func(ts_code=ts_code, start_date=start_date, end_date=end_date, fields=fields)
+                api_func = getattr(self.pro, api_name)
+                df = cached(tushare_key(api_name, ts_code, since, fields), FINANCIAL_TTL,
+                            lambda: api_func(ts_code=ts_code, start_date=since, fields=fields))
                 if df.empty: return pd.DataFrame()
-                df = df[df['end_date'].str.endswith('1231')]
+                df = df[(df['end_date'].astype('int64') % 10000 == 1231) & (df['end_date'] >= start_date)]
                 return df.drop_duplicates(subset=['end_date'])
             except Exception as e:
                 logger.warning(f"Error fetching financial sheet: {e}")
                 return pd.DataFrame()
 
-        df_inc = get_sheet(self.pro.income, fields_income)
-        df_bal = get_sheet(self.pro.balancesheet, fields_bal)
-        df_cash = get_sheet(self.pro.cashflow, fields_cash)
-        df_fina = get_sheet(self.pro.fina_indicator, fields_fina)
+        df_inc, df_bal, df_cash, df_fina = await asyncio.gather(
+            run_blocking(get_sheet, 'income', fields_income),
+            run_blocking(get_sheet, 'balancesheet', fields_bal),
+            run_blocking(get_sheet, 'cashflow', fields_cash),
+            run_blocking(get_sheet, 'fina_indicator', fields_fina)
+        )
 
         dfs = [df_inc, df_bal, df_cash, df_fina]
-        dfs = [d for d in dfs if not d.empty]
+        # An empty sheet may be a swallowed fetch error; flag it so the report is not cached
+        complete = all(not d.empty for d in dfs)
+        dfs = [d.set_index(['ts_code', 'end_date']) for d in dfs if not d.empty]
         
         if not dfs:
-            return pd.DataFrame()
-            
-        merged = dfs[0]
-        for d in dfs[1:]:
-            merged = pd.merge(merged, d, on=['ts_code', 'end_date'], how='outer')
+            merged = pd.DataFrame()
+        else:
+            # Single outer join on the (unique) sheet index instead of chained merges
+            merged = dfs[0].join(dfs[1:], how='outer') if len(dfs) > 1 else dfs[0]
+            merged = merged.reset_index().sort_values('end_date').reset_index(drop=True)
             
-        merged = merged.sort_values('end_date').reset_index(drop=True)
+        merged.attrs['complete'] = complete
         return merged
 
     def _calculate_statistical_array(self, financials: pd.DataFrame, daily_df: pd.DataFrame) -> Dict:
@@ -177,60 +286,67 @@ class ValueLineService:
         if financials.empty:
             return {}
 
-        data = []
-        for _, row in financials.iterrows():
-            year = row['end_date'][:4]
-            shares = row.get('total_share', 0)
-            if pd.isna(shares) or shares == 0:
-                shares = 1 
-                
-            sales_ps = row.get('total_revenue', 0) / shares
-            eps = row.get('n_income', 0) / shares
-            bvps = row.get('total_hldr_eqy_exc_min_int', 0) / shares
-            cf_ps = row.get('n_cashflow_act', 0) / shares
-            
-            roe = row.get('roe', 0)
-            net_margin = row.get('netprofit_margin', 0)
-            
-            year_daily = daily_df[daily_df['trade_date'].str.startswith(year)]
-            if not year_daily.empty:
-                last_day = year_daily.iloc[-1]
-                pe = last_day.get('pe_ttm', 0)
-                pb = last_day.get('pb', 0)
-            else:
-                pe = 0
-                pb = 0
-
-            data.append({
-                "year": year,
-                "sales_per_share": round(sales_ps, 2),
-                "eps": round(eps, 2),
-                "cash_flow_per_share": round(cf_ps, 2),
-                "book_value_per_share": round(bvps, 2),
-                "pe_year_end": round(pe, 1) if pe else None,
-                "pb_year_end": round(pb, 2) if pb else None,
-                "roe": round(roe, 2),
-                "net_margin": round(net_margin, 2),
-                "shares_outstanding": round(shares / 100000000, 2) 
-            })
-            
-        return {"annual_data": data}
+        # Missing sheets fall back to 0, matching the old per-row .get(col, 0)
+        value_cols = ['total_share', 'total_revenue', 'n_income', 'total_hldr_eqy_exc_min_int',
+                      'n_cashflow_act', 'roe', 'netprofit_margin']
+        fin = financials.reindex(columns=value_cols, fill_value=0).astype('float64')
+        year = financials['end_date'].str[:4]
+        fin['year'] = year.astype('int16')
+        shares = fin['total_share'].replace(0, np.nan).fillna(1)
 
-    def _calculate_top_metrics(self, daily_df: pd.DataFrame, stats_array: Dict) -> Dict:
-        """Calculate header strip metrics"""
+        # Year-end valuation: last trading day of every year in one groupby, joined onto the annual rows
+        if not daily_df.empty:
+            daily = daily_df.reindex(columns=['trade_date', 'pe_ttm', 'pb'])
+            daily['year'] = daily['trade_date'].dt.year.astype('int16')
+            year_end = daily.groupby('year', sort=True).tail(1).set_index('year')[['pe_ttm', 'pb']]
+            fin = fin.join(year_end.astype('float64'), on='year')
+        else:
+            fin['pe_ttm'] = fin['pb'] = np.nan
+
+        table = pd.DataFrame({
+            "year": year,
+            "sales_per_share": (fin['total_revenue'] / shares).round(2),
+            "eps": (fin['n_income'] / shares).round(2),
+            "cash_flow_per_share": (fin['n_cashflow_act'] / shares).round(2),
+            "book_value_per_share": (fin['total_hldr_eqy_exc_min_int'] / shares).round(2),
+            "pe_year_end": fin['pe_ttm'].replace(0, np.nan).round(1),
+            "pb_year_end": fin['pb'].replace(0, np.nan).round(2),
+            "roe": fin['roe'].round(2),
+            "net_margin": fin['netprofit_margin'].round(2),
+            "shares_outstanding": (shares / 100000000).round(2)
+        })
+
+        return {"annual_data": table.to_dict('records')}
+
+    def _summarize_daily(self, daily_df: pd.DataFrame) -> Dict:
+        """Aggregates over the daily frame, computed once per report"""
         if daily_df.empty:
             return {}
+
+        # Latest row straight from the column arrays, no row Series
+        latest = {col: daily_df[col].to_numpy()[-1] for col in daily_df.columns}
+
+        pe = daily_df['pe_ttm'].to_numpy(dtype='float64') if 'pe_ttm' in daily_df else np.array([])
+        pe_median = 0 if np.isnan(pe).all() else float(np.nanmedian(pe))
+
+        return {
+            "latest_row": latest,
+            "pe_median": pe_median
+        }
+
+    def _calculate_top_metrics(self, daily_stats: Dict, stats_array: Dict) -> Dict:
+        """Calculate header strip metrics"""
+        if not daily_stats:
+            return {}
             
-        latest = daily_df.iloc[-1]
-        pe_history = daily_df['pe_ttm'].dropna()
-        pe_median = pe_history.median() if not pe_history.empty else 0
+        latest = daily_stats['latest_row']
         
         return {
-            "recent_price": latest['close'],
-            "pe_ttm": latest['pe_ttm'],
-            "pe_10y_median": round(pe_median, 1),
-            "div_yield": latest.get('dv_ratio', 0),
-            "market_cap": latest.get('total_mv', 0)
+            "recent_price": round(float(latest['close']), 4),
+            "pe_ttm": round(float(latest.get('pe_ttm', np.nan)), 4),
+            "pe_10y_median": round(daily_stats['pe_median'], 1),
+            "div_yield": round(float(latest.get('dv_ratio', 0)), 4),
+            "market_cap": float(latest.get('total_mv', 0))
         }
 
     def _generate_ranks(self, ts_code: str, daily_df: pd.DataFrame, stats_array: Dict) -> Dict:
@@ -250,82 +366,51 @@ class ValueLineService:
         # Sort by year ascending just in case
         data.sort(key=lambda x: x['year'])
         
-        def calc_cagr(key, years):
-            if len(data) < years + 1: return None
-            end_val = data[-1].get(key)
-            start_val = data[-(years+1)].get(key)
-            
-            if not start_val or not end_val or start_val <= 0 or end_val <= 0:
-                return None
-            
-            try:
-                cagr = (end_val / start_val) ** (1/years) - 1
-                return round(cagr * 100, 2)
-            except:
-                return None
+        metrics = {"sales": "sales_per_share", "eps": "eps", "bvps": "book_value_per_share"}
+        spans = np.array([5, 10])
+        values = np.array([[row.get(key) for key in metrics.values()] for row in data], dtype='float64')
+        cagr = _cagr_batch(values, spans)
 
+        # NaN (not computable) becomes None in _clean_data
         return {
-            "sales_5y": calc_cagr("sales_per_share", 5),
-            "sales_10y": calc_cagr("sales_per_share", 10),
-            "eps_5y": calc_cagr("eps", 5),
-            "eps_10y": calc_cagr("eps", 10),
-            "bvps_5y": calc_cagr("book_value_per_share", 5),
-            "bvps_10y": calc_cagr("book_value_per_share", 10)
+            f"{name}_{span}y": float(cagr[i, j])
+            for j, name in enumerate(metrics)
+            for i, span in enumerate(spans)
         }
 
     def _get_quarterly_data(self, ts_code: str) -> Dict:
         """Get recent quarters data with single-quarter calculation"""
         try:
             # Fetch last 6 periods to ensure we can calc 4-5 quarters
-            df = self.pro.income(ts_code=ts_code, period='', limit=8, fields='end_date,report_type,total_revenue,n_income')
+            fields = 'end_date,report_type,total_revenue,n_income'
+            df = cached(tushare_key('income_latest', ts_code, 8, fields), DAILY_TTL,
+                        lambda: self.pro.income(ts_code=ts_code, period='', limit=8, fields=fields))
             if df.empty: return {}
             
-            df['end_date'] = pd.to_datetime(df['end_date'])
-            df = df.sort_values('end_date')
-            
-            quarters = []
+            df['end_date'] = pd.to_datetime(df['end_date'], format='%Y%m%d')
+            df = df.sort_values('end_date').reset_index(drop=True)
+            prev = df[['end_date', 'total_revenue', 'n_income']].shift(1)
             
             # Simple logic: if Q1, take value. If Q2/3/4, subtract prev.
-            # Requires that we have the sequence.
+            # Requires that we have the sequence: same year and consecutive quarters (approx 3 months).
+            delta_days = (df['end_date'] - prev['end_date']).dt.days
+            same_year = df['end_date'].dt.year == prev['end_date'].dt.year
+            consecutive = same_year & (delta_days > 80) & (delta_days < 100)
+            is_q1 = df['end_date'].dt.month == 3
+            # Skip if gap is too large (e.g. missing Q2); the oldest row has no predecessor
+            keep = (consecutive | is_q1) & (df.index > 0)
             
-            for i in range(1, len(df)):
-                curr = df.iloc[i]
-                prev = df.iloc[i-1]
-                
-                curr_date = curr['end_date']
-                prev_date = prev['end_date']
-                
-                # Check if same year
-                if curr_date.year == prev_date.year:
-                    # Check if consecutive quarters (approx 3 months)
-                    delta_days = (curr_date - prev_date).days
-                    if 80 < delta_days < 100:
-                        q_rev = curr['total_revenue'] - prev['total_revenue']
-                        q_inc = curr['n_income'] - prev['n_income']
-                    else:
-                        # Fallback or Q1
-                        if curr_date.month == 3:
-                             q_rev = curr['total_revenue']
-                             q_inc = curr['n_income']
-                        else:
-                            # Skip if gap is too large (e.g. missing Q2)
-                            continue
-                else:
-                    # New year, likely Q1
-                    if curr_date.month == 3:
-                        q_rev = curr['total_revenue']
-                        q_inc = curr['n_income']
-                    else:
-                        continue
-                
-                quarters.append({
-                    "date": curr_date.strftime('%Y-%m-%d'),
-                    "revenue": round(q_rev / 100000000, 2), # In 100M
-                    "eps": round(q_inc / 100000000, 2) # Just showing Net Income in 100M for now as EPS needs shares
-                })
+            q_rev = (df['total_revenue'] - prev['total_revenue']).where(consecutive, df['total_revenue'])
+            q_inc = (df['n_income'] - prev['n_income']).where(consecutive, df['n_income'])
+            
+            quarters = pd.DataFrame({
+                "date": df['end_date'].dt.strftime('%Y-%m-%d'),
+                "revenue": (q_rev / 100000000).round(2), # In 100M
+                "eps": (q_inc / 100000000).round(2) # Just showing Net Income in 100M for now as EPS needs shares
+            })[keep]
                 
             # Reverse to show newest first
-            return {"quarters": quarters[::-1]}
+            return {"quarters": quarters.iloc[::-1].to_dict('records')}
         except Exception as e:
             logger.warning(f"Quarterly calc error: {e}")
             return {}
@@ -333,7 +418,9 @@ class ValueLineService:
     def _get_capital_structure(self, ts_code: str) -> Dict:
         """Latest Balance Sheet Info"""
         try:
-            df = self.pro.balancesheet(ts_code=ts_code, limit=1, fields='total_assets,total_liab,total_hldr_eqy_exc_min_int,money_cap,short_loan,long_loan')
+            fields = 'total_assets,total_liab,total_hldr_eqy_exc_min_int,money_cap,short_loan,long_loan'
+            df = cached(tushare_key('balancesheet_latest', ts_code, 1, fields), DAILY_TTL,
+                        lambda: self.pro.balancesheet(ts_code=ts_code, limit=1, fields=fields))
             if df.empty: return {}
             row = df.iloc[0]
             
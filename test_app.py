@@ -0,0 +1,94 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+
+import app
+
+
+class FakePro:
+    """Minimal Tushare client: fina_indicator rows exist but every roe is null"""
+
+    def daily_basic(self, ts_code=None, start_date=None, end_date=None, fields=None):
+        return pd.DataFrame({'ts_code': ts_code, 'trade_date': ['20240103', '20240102'],
+                             'pe_ttm': [12.5, 12.0], 'pb': [1.1, 1.0]})
+
+    def fina_indicator(self, ts_code=None, start_date=None, end_date=None, fields=None):
+        return pd.DataFrame({'ts_code': ts_code, 'end_date': ['20231231', '20230930'], 'roe': [None, None]})
+
+
+def fake_pro_bar(ts_code=None, api=None, start_date=None, end_date=None, adj=None, fields=None):
+    return pd.DataFrame({'ts_code': ts_code, 'trade_date': ['20240103', '20240102'], 'close': [10.2, 10.0]})
+
+
+def test_stock_data_all_null_roe(monkeypatch):
+    monkeypatch.setattr(app, 'pro', FakePro())
+    monkeypatch.setattr(app.ts, 'pro_bar', fake_pro_bar)
+
+    data = asyncio.run(app.get_stock_data_tushare('999001.SZ', '2024-01-01', '2024-01-05'))
+
+    assert data['trade_date'].tolist() == ['20240102', '20240103']
+    assert np.isnan(data['roe'].to_numpy()).all()
+
+
+class AsOfPro(FakePro):
+    """Quarter end 20231231 is a Sunday; the first trade date precedes every report period"""
+    trade_dates = ['20240102', '20231229', '20230928']
+
+    def daily_basic(self, ts_code=None, start_date=None, end_date=None, fields=None):
+        return pd.DataFrame({'ts_code': ts_code, 'trade_date': self.trade_dates, 'pe_ttm': 12.0, 'pb': 1.0})
+
+    def fina_indicator(self, ts_code=None, start_date=None, end_date=None, fields=None):
+        return pd.DataFrame({'ts_code': ts_code, 'end_date': ['20231231', '20230930'], 'roe': [10.0, 8.0]})
+
+
+def test_stock_data_roe_as_of(monkeypatch):
+    monkeypatch.setattr(app, 'pro', AsOfPro())
+    monkeypatch.setattr(app.ts, 'pro_bar', lambda ts_code=None, **kwargs: pd.DataFrame(
+        {'ts_code': ts_code, 'trade_date': AsOfPro.trade_dates, 'close': 10.0}))
+
+    data = asyncio.run(app.get_stock_data_tushare('999002.SZ', '2023-09-01', '2024-01-05'))
+
+    assert data['trade_date'].tolist() == ['20230928', '20231229', '20240102']
+    roe = data['roe'].tolist()
+    # Before the first report period: no ROE yet
+    assert np.isnan(roe[0])
+    # Last trading day before the weekend quarter end keeps the prior period
+    assert roe[1] == 8.0
+    # The weekend quarter end takes effect on the next trading day
+    assert roe[2] == 10.0
+
+
+
+class SlowStockList:
+    """stock_basic that counts full-list downloads"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def stock_basic(self, exchange=None, list_status=None, fields=None):
+        self.calls += 1
+        time.sleep(0.05)
+        return pd.DataFrame({'ts_code': ['600519.SH'], 'symbol': ['600519'], 'name': ['贵州茅台']})
+
+
+def test_stock_list_refreshed_once(monkeypatch):
+    fake = SlowStockList()
+    monkeypatch.setattr(app, 'pro', fake)
+    stale = np.array(['000001'])
+    monkeypatch.setattr(app, '_STOCK_LIST_CACHE', {"ts": 0, "symbols": stale, "names": np.array(['平安银行']),
+                                                   "names_lower": np.array(['平安银行'])})
+    monkeypatch.setattr(app, '_STOCK_LIST_LOCK', asyncio.Lock())
+
+    async def symbols():
+        return (await app.get_stock_list_index())['symbols']
+
+    async def search_concurrently():
+        return await asyncio.gather(*[symbols() for _ in range(5)])
+
+    results = asyncio.run(search_concurrently())
+
+    assert fake.calls == 1
+    # Requests arriving during the refresh keep the old list
+    assert any(r is stale for r in results)
+    assert app._STOCK_LIST_CACHE['symbols'].tolist() == ['600519']
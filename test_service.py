@@ -2,6 +2,7 @@ import os
 import sys
 import logging
 import json
+import asyncio
 from services import ValueLineService
 
 # Setup logging
@@ -34,7 +35,7 @@ def test_service():
     print(f"Fetching report for {stock_code}...")
     
     try:
-        data = service.get_report_data(stock_code)
+        data = asyncio.run(service.get_report_data(stock_code))
         
         # Output summary
         print("\n=== Meta ===")
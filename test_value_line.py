@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+
+import cache
+import services
+from services import ValueLineService
+
+
+class FakeClock:
+    """Stands in for datetime / time in cache and services, set to Beijing wall time"""
+
+    def __init__(self):
+        self.now = None
+
+    def set(self, text):
+        self.now = datetime.strptime(text, '%Y-%m-%d %H:%M').replace(tzinfo=cache.MARKET_TZ)
+
+    def datetime(self):
+        clock = self
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now.astimezone(tz) if tz else clock.now.replace(tzinfo=None)
+
+        return FakeDatetime
+
+
+STATEMENTS = pd.DataFrame({
+    'ts_code': '000001.SZ',
+    'end_date': ['20231231', '20230930', '20230630', '20230331', '20221231'],
+    'report_type': '1',
+    'total_revenue': [400.0, 300.0, 200.0, 100.0, 380.0],
+    'n_income': [40.0, 30.0, 20.0, 10.0, 38.0],
+    'total_share': 10.0,
+    'total_hldr_eqy_exc_min_int': 200.0,
+    'total_liab': 50.0,
+    'total_assets': 250.0,
+    'money_cap': 20.0,
+    'short_loan': 5.0,
+    'long_loan': 1.0,
+    'n_cashflow_act': 35.0,
+    'c_paid_for_fix_assets': 3.0,
+    'roe': 12.0,
+    'grossprofit_margin': 30.0,
+    'netprofit_margin': 10.0,
+})
+
+
+class FakePro:
+    """Tushare client whose daily series only reach the last published trade date"""
+
+    def __init__(self, trade_dates):
+        self.trade_dates = trade_dates
+        self.published = None
+        self.daily_calls = 0
+
+    def daily(self, start_date, end_date):
+        self.daily_calls += 1
+        dates = [d for d in self.trade_dates if start_date <= d <= min(end_date, self.published)]
+        return pd.DataFrame({'ts_code': '000001.SZ', 'trade_date': dates[::-1],
+                             'close': 10.0, 'pe_ttm': 8.0, 'pb': 1.0, 'dv_ratio': 2.0, 'total_mv': 1e6})
+
+    def daily_basic(self, ts_code=None, start_date=None, end_date=None, fields=None):
+        return self.daily(start_date, end_date)[fields.split(',')]
+
+    def stock_basic(self, ts_code=None, fields=None):
+        return pd.DataFrame({'ts_code': [ts_code], 'symbol': '000001', 'name': '平安银行', 'fullname': '平安银行',
+                             'industry': '银行', 'market': '主板', 'list_date': '19910403'})[fields.split(',')]
+
+    def statements(self, ts_code=None, fields=None, **kwargs):
+        return STATEMENTS[fields.split(',')]
+
+    income = balancesheet = cashflow = fina_indicator = statements
+
+
+def test_report_refreshed_after_publication(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, 'datetime', clock.datetime())
+    monkeypatch.setattr(services, 'datetime', clock.datetime())
+    monkeypatch.setattr(cache, 'time', SimpleNamespace(time=lambda: clock.now.timestamp()))
+    monkeypatch.setattr(cache, '_cache', cache.TushareCache())
+
+    pro = FakePro(['20240102', '20240103'])
+    monkeypatch.setattr(services.ts, 'pro_bar',
+                        lambda ts_code=None, api=None, start_date=None, end_date=None, adj=None, fields=None:
+                        pro.daily(start_date, end_date)[fields.split(',')])
+    service = ValueLineService('token', pro=pro)
+
+    # Intraday build: only yesterday's rows are published
+    clock.set('2024-01-03 10:00')
+    pro.published = '20240102'
+    report = asyncio.run(service.get_report_data_cached('000001'))
+    assert report['chart']['dates'][-1] == '2024-01-02'
+
+    # Today's rows land after the close, but before the cutoff the cached report is served
+    pro.published = '20240103'
+    clock.set('2024-01-03 16:00')
+    assert asyncio.run(service.get_report_data_cached('000001')) is report
+
+    # After the cutoff both the report and the daily frames behind it are refetched
+    calls = pro.daily_calls
+    clock.set('2024-01-03 17:30')
+    report = asyncio.run(service.get_report_data_cached('000001'))
+    assert report['chart']['dates'][-1] == '2024-01-03'
+    assert pro.daily_calls > calls
+
+
+class QuarterlyPro:
+    """income(limit=8) with YTD figures (in 100M) for the given end dates, newest first"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def income(self, ts_code=None, period=None, limit=None, fields=None):
+        rows = self.rows[::-1]
+        return pd.DataFrame({'end_date': [r[0] for r in rows], 'report_type': '1',
+                             'total_revenue': [r[1] * 1e8 for r in rows],
+                             'n_income': [r[2] * 1e8 for r in rows]})[fields.split(',')]
+
+
+def test_quarterly_single_quarter_rules(monkeypatch):
+    monkeypatch.setattr(cache, '_cache', cache.TushareCache())
+    pro = QuarterlyPro([
+        ('20220930', 9, 0.9),   # oldest row: no predecessor, dropped
+        ('20221231', 12, 1.2),  # Q4 after Q3: YTD difference
+        ('20230331', 4, 0.4),   # Q1: taken as is
+        ('20230930', 11, 1.1),  # Q2 missing: dropped
+        ('20231231', 15, 1.5),  # Q4 after Q3: YTD difference
+        ('20240331', 5, 0.5),
+        ('20240630', 11, 1.1),
+        ('20240630', 11, 1.1),  # duplicate end_date: dropped
+    ])
+
+    quarters = ValueLineService('token', pro=pro)._get_quarterly_data('000001.SZ')['quarters']
+
+    assert quarters == [
+        {'date': '2024-06-30', 'revenue': 6.0, 'eps': 0.6},
+        {'date': '2024-03-31', 'revenue': 5.0, 'eps': 0.5},
+        {'date': '2023-12-31', 'revenue': 4.0, 'eps': 0.4},
+        {'date': '2023-03-31', 'revenue': 4.0, 'eps': 0.4},
+        {'date': '2022-12-31', 'revenue': 3.0, 'eps': 0.3},
+    ]